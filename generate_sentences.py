@@ -1,15 +1,61 @@
+import argparse
+import asyncio
+import hashlib
+import json
 import random
+import sqlite3
 import string
-import requests
 import os
 import sys
-import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import httpx
+import numpy as np
 import phf
 
+try:
+    import liburing
+except ImportError:
+    liburing = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Constants
 NUM_SENTENCES = 1000
 NUM_GIBBERISH = 1000
-SLANG_PROMPT = "Generate a casual English sentence using modern slang. Keep it short (under 15 words)."
+MAX_CONCURRENT_REQUESTS = 20
+SENTENCES_PER_REQUEST = 20
+WRITE_CHUNK = 64
+CACHE_PATH = ".sentence_cache.db"
+SLANG_PROMPT = (
+    f"Generate {SENTENCES_PER_REQUEST} distinct casual English sentences "
+    "using modern slang, one per line, each under 15 words."
+)
+MODEL = "openai/gpt-3.5-turbo"
+
+# Every batch sends the identical request body, so serialize it exactly once
+_PAYLOAD = json.dumps(
+    {
+        "model": MODEL,
+        "messages": [{"role": "user", "content": SLANG_PROMPT}],
+        "max_tokens": 600,
+    }
+).encode()
+
+# Maps any byte onto a lowercase ASCII letter in one C-level pass
+_LC_TABLE = bytes((b % 26) + ord("a") for b in range(256))
+
+# One PCG64 generator shared by all sampling; much cheaper per draw than
+# the global Mersenne-Twister behind the random module
+_RNG = np.random.default_rng()
 
 
 def generate_local_english_sentences():
@@ -25,85 +71,341 @@ def generate_local_english_sentences():
     return sentences
 
 
-def generate_english_sentences():
+def _open_cache(path=CACHE_PATH):
+    """Open the on-disk response cache, creating it on first use"""
+    db = sqlite3.connect(path)
+    # WAL lets cache writes interleave with reads from concurrent tasks
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, sentence TEXT)"
+    )
+    return db
+
+
+def _cache_key(model, prompt, nonce):
+    # Include the nonce so each of the N sentences gets its own cache slot
+    payload = json.dumps(
+        {"model": model, "prompt": prompt, "nonce": nonce}, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _split_batch(text):
+    """Split one multi-line completion into clean, non-empty sentences"""
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+async def _fetch_sentence_batch(client, sem, headers, nonce, cache, report_http_version=False):
+    """Fetch one batch of sentences from the API, falling back to local ones on failure"""
+    if cache is not None:
+        key = _cache_key(MODEL, SLANG_PROMPT, nonce)
+        row = cache.execute(
+            "SELECT sentence FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            return _split_batch(row[0])
+    async with sem:
+        # Only back off when the server actually rate-limits (HTTP 429) or a
+        # request fails transiently: 0.5s, 1s, 2s, giving up after 3 attempts
+        delay = 0.5
+        for attempt in range(3):
+            try:
+                response = await client.post(
+                    "https://openrouter.ai/api/v1/chat/completions",
+                    headers=headers,
+                    content=_PAYLOAD,
+                )
+                if report_http_version and attempt == 0:
+                    print(f"Negotiated {response.http_version} with the API host")
+                if response.status_code == 429:
+                    await asyncio.sleep(
+                        float(response.headers.get("Retry-After", delay))
+                    )
+                    delay *= 2
+                    continue
+                response.raise_for_status()
+                if orjson is not None:
+                    payload = orjson.loads(response.content)
+                else:
+                    payload = response.json()
+                text = payload["choices"][0]["message"]["content"].strip()
+                if cache is not None:
+                    cache.execute(
+                        "INSERT OR REPLACE INTO responses VALUES (?, ?)", (key, text)
+                    )
+                    cache.commit()
+                return _split_batch(text)
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                # ValueError also covers JSONDecodeError from a malformed
+                # 200 body (stdlib and orjson alike)
+                if attempt == 2:
+                    print(f"API request failed: {e}. Falling back to local sentences.")
+                    break
+                await asyncio.sleep(delay)
+                delay *= 2
+        return generate_local_english_sentences()[:SENTENCES_PER_REQUEST]
+
+
+async def _stream_to_file(queue, filename, num_batches):
+    """Consume fetched batches, dedupe them, and flush to disk in chunks"""
     sentences = []
+    seen = set()
+    buffer = []
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for _ in range(num_batches):
+            batch = await queue.get()
+            for sentence in batch:
+                if sentence not in seen:
+                    seen.add(sentence)
+                    sentences.append(sentence)
+                    buffer.append(sentence)
+            if len(buffer) >= WRITE_CHUNK:
+                os.write(fd, ("\n".join(buffer) + "\n").encode("utf-8"))
+                buffer.clear()
+        if buffer:
+            os.write(fd, ("\n".join(buffer) + "\n").encode("utf-8"))
+    finally:
+        os.close(fd)
+    return sentences
+
+
+async def _fetch_all_sentences(headers, cache, output_file):
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    queue = asyncio.Queue()
+    num_batches = NUM_SENTENCES // SENTENCES_PER_REQUEST
+
+    async def produce(i):
+        batch = await _fetch_sentence_batch(
+            client, sem, headers, i, cache, report_http_version=(i == 0)
+        )
+        await queue.put(batch)
+
+    # HTTP/2 multiplexes the concurrent requests over a handful of
+    # connections instead of one TCP+TLS connection per in-flight request
+    limits = httpx.Limits(max_connections=4, max_keepalive_connections=4)
+    async with httpx.AsyncClient(http2=True, limits=limits, timeout=30.0) as client:
+        # The writer drains the queue while fetches are still in flight, so
+        # disk I/O overlaps the network tail instead of running after it
+        writer = asyncio.create_task(
+            _stream_to_file(queue, output_file, num_batches)
+        )
+        await asyncio.gather(*(produce(i) for i in range(num_batches)))
+        return await writer
+
+
+def generate_english_sentences(output_file, use_cache=True):
     api_key = os.getenv("OPENROUTER_API_KEY")
-    print(api_key)
 
     if not api_key:
         print(
             "Warning: OPENROUTER_API_KEY environment variable not set. Using local sentence generator."
         )
-        return generate_local_english_sentences()
+        sentences = generate_local_english_sentences()
+        save_to_file(output_file, sentences)
+        return sentences
 
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
 
-    for _ in range(NUM_SENTENCES):
-        try:
-            data = {
-                "model": "openai/gpt-3.5-turbo",
-                "messages": [{"role": "user", "content": SLANG_PROMPT}],
-            }
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30,
-            )
-            # Add a short delay between API calls
-            time.sleep(1)
-            response.raise_for_status()
-            sentences.append(
-                response.json()["choices"][0]["message"]["content"].strip()
-            )
-        except (requests.exceptions.RequestException, KeyError) as e:
-            print(f"API request failed: {e}. Falling back to local sentence generator.")
-            return generate_local_english_sentences()
+    cache = _open_cache() if use_cache else None
+    try:
+        return asyncio.run(_fetch_all_sentences(headers, cache, output_file))
+    finally:
+        if cache is not None:
+            cache.close()
 
-    return sentences
+
+# Longest possible sentence: 7 words of 8 chars plus 6 spaces
+_MAX_GIBBERISH_LEN = 7 * 8 + 6
+
+if njit is not None:
+
+    @njit(parallel=True, cache=True)
+    def _fill_gibberish(out, lens):
+        for i in prange(out.shape[0]):
+            num_words = np.random.randint(3, 8)
+            pos = 0
+            for w in range(num_words):
+                for _ in range(np.random.randint(3, 9)):
+                    out[i, pos] = 97 + np.random.randint(0, 26)
+                    pos += 1
+                if w < num_words - 1:
+                    out[i, pos] = 32
+                    pos += 1
+            lens[i] = pos
+
+
+def _generate_gibberish_numpy(count=NUM_GIBBERISH, rng=None):
+    # Struct-of-arrays layout: every character of every sentence lives in
+    # one flat uint8 buffer, with word lengths and sentence offsets kept as
+    # side arrays. No per-word Python objects are ever created; the only
+    # Python-level loop is one str construction per sentence at the end.
+    if rng is None:
+        rng = _RNG
+    word_counts = rng.integers(3, 8, size=count)
+    word_lens = rng.integers(3, 9, size=(count, 7))
+    word_lens[np.arange(7) >= word_counts[:, None]] = 0
+
+    totals = word_lens.sum(axis=1) + word_counts - 1
+    offsets = np.concatenate(([0], totals.cumsum()))
+    raw = rng.bytes(int(offsets[-1])).translate(_LC_TABLE)
+    buf = np.frombuffer(bytearray(raw), dtype=np.uint8)
+
+    # Overwrite the separator slots with spaces in one vectorized pass
+    word_ends = word_lens.cumsum(axis=1)
+    word_idx = np.arange(7)
+    space_mask = word_idx[None, :] < (word_counts - 1)[:, None]
+    space_pos = offsets[:-1, None] + word_ends + word_idx[None, :]
+    buf[space_pos[space_mask]] = ord(" ")
+
+    return [
+        buf[offsets[i] : offsets[i + 1]].tobytes().decode("ascii")
+        for i in range(count)
+    ]
+
+
+def _gen_shard(args):
+    count, seed = args
+    return _generate_gibberish_numpy(count, np.random.default_rng(seed))
+
+
+# Below this size the process pool costs more than it saves
+_SHARD_THRESHOLD = 100_000
 
 
 def generate_gibberish():
-    gibberish = []
-    for _ in range(NUM_GIBBERISH):
-        # Generate random string of 3-7 "words" with 3-8 characters each
-        words = []
-        for _ in range(random.randint(3, 7)):
-            word_length = random.randint(3, 8)
-            word = "".join(random.choices(string.ascii_lowercase, k=word_length))
-            words.append(word)
-        gibberish.append(" ".join(words))
-    return gibberish
+    # Generate random strings of 3-7 "words" with 3-8 characters each.
+    # With numba installed the whole fill runs as a parallel JIT kernel
+    # across cores; otherwise fall back to the vectorized NumPy path,
+    # sharded across a process pool once the corpus is big enough.
+    if njit is not None:
+        out = np.empty((NUM_GIBBERISH, _MAX_GIBBERISH_LEN), dtype=np.uint8)
+        lens = np.empty(NUM_GIBBERISH, dtype=np.int32)
+        _fill_gibberish(out, lens)
+        return [
+            bytes(out[i, : lens[i]]).decode("ascii") for i in range(NUM_GIBBERISH)
+        ]
+    if NUM_GIBBERISH < _SHARD_THRESHOLD:
+        return _generate_gibberish_numpy()
+    workers = os.cpu_count() or 1
+    base, extra = divmod(NUM_GIBBERISH, workers)
+    counts = [base + (1 if i < extra else 0) for i in range(workers)]
+    seed = int.from_bytes(os.urandom(8), "little")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        shards = executor.map(
+            _gen_shard, [(c, seed + i) for i, c in enumerate(counts)]
+        )
+        return [sentence for shard in shards for sentence in shard]
+
 
+def generate_phf_map(sentences):
+    """Generate a perfect hash function map of the unique words in the sentences"""
+    words = {
+        word.lower().strip(string.punctuation)
+        for sentence in sentences
+        for word in sentence.split()
+        if word.strip(string.punctuation)
+    }
+    return phf.PHF(sorted(words))
+
+# Linux caps a single writev at this many iovec entries
+_IOV_MAX = 1024
 
-def generate_phf_map(words):
-    """Generate a perfect hash function map from the given words"""
-    phf_map = phf.PHF(words)
-    return phf_map
 
 def save_to_file(filename, data):
-    with open(filename, "w") as f:
-        for item in data:
-            f.write(f"{item}\n")
+    # Scatter-gather write: the kernel gathers the per-line bytes objects
+    # directly, so no joined copy of the whole payload is ever allocated
+    iov = [(item + "\n").encode("utf-8") for item in data]
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for start in range(0, len(iov), _IOV_MAX):
+            os.writev(fd, iov[start : start + _IOV_MAX])
+    finally:
+        os.close(fd)
+
+def _save_files_io_uring(blobs):
+    """Submit all file writes as one io_uring batch"""
+    ring = liburing.io_uring()
+    liburing.io_uring_queue_init(8, ring, 0)
+    fds = []
+    try:
+        for index, (filename, blob) in enumerate(blobs):
+            fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            fds.append(fd)
+            sqe = liburing.io_uring_get_sqe(ring)
+            liburing.io_uring_prep_write(sqe, fd, blob, len(blob), 0)
+            liburing.io_uring_sqe_set_data64(sqe, index)
+        # One submission syscall covers every queued write
+        liburing.io_uring_submit(ring)
+        cqe = liburing.io_uring_cqe()
+        for _ in blobs:
+            liburing.io_uring_wait_cqe(ring, cqe)
+            filename, blob = blobs[cqe.user_data]
+            res = cqe.res
+            liburing.io_uring_cqe_seen(ring, cqe)
+            if res < 0:
+                raise OSError(-res, os.strerror(-res), filename)
+            if res != len(blob):
+                raise OSError(
+                    f"short write to {filename}: {res} of {len(blob)} bytes"
+                )
+    finally:
+        for fd in fds:
+            os.close(fd)
+        liburing.io_uring_queue_exit(ring)
+
+
+def save_files(files):
+    """Write several (filename, lines) outputs, batching via io_uring when available"""
+    if liburing is not None and sys.platform == "linux":
+        blobs = [
+            (filename, ("\n".join(data) + "\n").encode("utf-8"))
+            for filename, data in files
+        ]
+        _save_files_io_uring(blobs)
+        return
+    for filename, data in files:
+        save_to_file(filename, data)
+
+
+def _generate_and_save_gibberish():
+    gibberish = generate_gibberish()
+    save_files([("gibberish_sentences.txt", gibberish)])
+    return gibberish
+
 
 def save_phf_map(filename, phf_map):
     """Save the PHF map to a Rust source file"""
+    # Sorted keys keep the generated file stable across runs, and one
+    # joined write replaces a format+write call per entry
+    body = "\n".join(f'    "{word}" => (),' for word in sorted(phf_map.keys()))
     with open(filename, "w") as f:
-        f.write("use phf::phf_map;\n\n")
-        f.write("pub static WORD_MAP: phf::Map<&'static str, ()> = phf_map! {\n")
-        for word in phf_map.keys():
-            f.write(f'    "{word}" => (),\n')
-        f.write("};\n")
+        f.write(
+            "use phf::phf_map;\n\n"
+            "pub static WORD_MAP: phf::Map<&'static str, ()> = phf_map! {\n"
+            + body
+            + "\n};\n"
+        )
 
 
 def main():
-    print("Generating English sentences...")
-    english_sentences = generate_english_sentences()
-    print("Generating gibberish...")
-    gibberish_sentences = generate_gibberish()
+    parser = argparse.ArgumentParser(description="Generate training data")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="skip the on-disk cache and always hit the API",
+    )
+    args = parser.parse_args()
 
-    save_to_file("english_sentences.txt", english_sentences)
-    save_to_file("gibberish_sentences.txt", gibberish_sentences)
+    print("Generating English sentences and gibberish...")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # Gibberish generation is short and CPU-bound; run and save it while
+        # the fetcher streams English sentences to disk
+        gibberish_future = executor.submit(_generate_and_save_gibberish)
+        english_sentences = generate_english_sentences(
+            "english_sentences.txt", use_cache=not args.no_cache
+        )
+        gibberish_future.result()
     
     # Generate PHF map from English sentences
     print("Generating PHF map...")